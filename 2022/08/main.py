@@ -1,5 +1,7 @@
 from absl import app
 from absl import flags
+from typing import Callable
+from common import grid
 
 import numpy as np
 
@@ -8,58 +10,58 @@ _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
 
 
 def parse(path: str) -> np.ndarray:
-  with open(path, 'r') as f:
-    lines = f.read().splitlines()
+  return grid.read_grid(path) - ord('0')
 
-  n, m = len(lines), len(lines[0])
-  ts = np.zeros([n, m], dtype=np.int32)
-  for i in range(n):
-    for j in range(m):
-      ts[i, j] = int(lines[i][j])
 
-  return ts
+def from_all_sides(fn: Callable[[np.ndarray], np.ndarray],
+                   ts: np.ndarray) -> list[np.ndarray]:
+  """Applies `fn` looking at the forest from the left, right, top and bottom.
+
+  `fn` maps a grid to a grid of the same shape, looking at each row from the
+  left. The grid is flipped and transposed so that each side becomes the left,
+  and the results are mapped back.
+  """
+  return [
+      fn(ts),
+      fn(ts[:, ::-1])[:, ::-1],
+      fn(ts.T).T,
+      fn(ts.T[:, ::-1])[:, ::-1].T,
+  ]
+
+
+def tallest_before(ts: np.ndarray) -> np.ndarray:
+  """Height of the tallest tree on the left of each tree, -1 if none."""
+  tallest = np.full(ts.shape, -1, dtype=np.int16)
+  tallest[:, 1:] = np.maximum.accumulate(ts[:, :-1], axis=1)
+  return tallest
 
 
 def visible_trees(ts: np.ndarray) -> int:
+  ms = from_all_sides(tallest_before, ts)
+  return int(np.count_nonzero(np.any(ts > np.stack(ms), axis=0)))
+
+
+def viewing_distance(ts: np.ndarray) -> np.ndarray:
+  """Number of trees seen looking left from each tree."""
   n, m = ts.shape
-  count = 2 * (n + m) - 4  # Edges are always visible.
-  for i in range(1, n - 1):
-    for j in range(1, m - 1):
-      # Find the tallest trees on the left, right, up and down
-      # of the (i,j)th tree.
-      ms = np.array([
-          np.amax(ts[i, :j]),
-          np.amax(ts[i, j + 1:]),
-          np.amax(ts[:i, j]),
-          np.amax(ts[i + 1:, j]),
-      ])
-      if any(ms < ts[i, j]):
-        count += 1
-  return count
-
-
-def count_until(a: np.ndarray) -> int:
-  """Keeps counting until the first non-zero element is found."""
-  a = np.array(a, dtype=bool)
-  if np.all(a == False):
-    return a.size
-  return np.argmax(a) + 1
+  rows = np.arange(n)
+  heights = np.arange(int(ts.max()) + 1)
+
+  # `last[i, h]` is the last column on row `i` with a tree of height `h` or
+  # more. The edge (column 0) blocks the view as well.
+  last = np.zeros([n, heights.size], dtype=np.int32)
+  dists = np.zeros([n, m], dtype=np.int32)
+  for j in range(m):
+    col = ts[:, j]
+    dists[:, j] = j - last[rows, col]
+    last[heights[None, :] <= col[:, None]] = j
+
+  return dists
 
 
 def scenic_score(ts: np.ndarray) -> int:
-  best = 0
-  n, m = ts.shape
-  for i in range(1, n - 1):
-    for j in range(1, m - 1):
-      t = ts[i, j]
-      cs = np.array([
-          count_until(ts[i, j - 1::-1] >= t),
-          count_until(ts[i, j + 1:] >= t),
-          count_until(ts[i - 1::-1, j] >= t),
-          count_until(ts[i + 1:, j] >= t),
-      ])
-      best = max(best, np.prod(cs))
-  return best
+  cs = from_all_sides(viewing_distance, ts)
+  return int(np.max(np.prod(np.stack(cs), axis=0, dtype=np.int64)))
 
 
 def main(argv):
@@ -5,9 +5,14 @@ from typing import Sequence
 
 import dataclasses
 import enum
+import numpy as np
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_ENGINE = flags.DEFINE_enum(
+    'engine', 'array', ['array', 'points'],
+    'How to represent the rope. `points` is a sequence of points, `array` a '
+    '`k x 2` array of knots updated in place.')
 
 
 class Direction(enum.StrEnum):
@@ -84,6 +89,56 @@ def simulate(chain: Chain, cmds: Sequence[Cmd]) -> int:
   return len(visited)
 
 
+def simulate_array(num_knots: int, cmds: Sequence[Cmd]) -> int:
+  """Same as `simulate` on a chain of `num_knots` knots at the origin.
+
+  The knots are stored in a `num_knots x 2` array. A knot that is not touching
+  the one before it takes a single step towards it on each axis, and once a
+  knot doesn't move, none of the ones after it do. Once the rope is stretched
+  along the moving direction, the rest of the command is applied at once.
+  """
+  deltas = {
+      Direction.Up: np.array([1, 0]),
+      Direction.Down: np.array([-1, 0]),
+      Direction.Right: np.array([0, 1]),
+      Direction.Left: np.array([0, -1]),
+  }
+
+  # Tail positions are encoded as ints, `y` stays far below the stride.
+  STRIDE = 1 << 32
+
+  knots = np.zeros([num_knots, 2], dtype=np.int64)
+  visited = {0}
+  for cmd in cmds:
+    delta = deltas[cmd.direction]
+    dx, dy = delta.tolist()
+    delta_key = dx * STRIDE + dy
+    for step in range(cmd.count):
+      if np.all(knots[:-1] - knots[1:] == delta):
+        # The rope is stretched in a straight line along `delta`, so the
+        # remaining steps move all the knots by `delta`. The tail visits the
+        # next `rest` points of the line.
+        rest = cmd.count - step
+        x, y = knots[-1].tolist()
+        tail_key = x * STRIDE + y
+        visited.update(
+            range(tail_key + delta_key, tail_key + (rest + 1) * delta_key,
+                  delta_key))
+        knots += rest * delta
+        break
+
+      knots[0] += delta
+      for i in range(1, num_knots):
+        diff = knots[i - 1] - knots[i]
+        if np.abs(diff).max() <= 1:
+          break
+        knots[i] += np.sign(diff)
+      else:
+        x, y = knots[-1].tolist()
+        visited.add(x * STRIDE + y)
+  return len(visited)
+
+
 def parse(path: str) -> Sequence[Cmd]:
   with open(path) as f:
     lines = f.read().splitlines()
@@ -98,6 +153,11 @@ def parse(path: str) -> Sequence[Cmd]:
 def main(argv):
   cmds = parse(_INPUT_FILE.value)
 
+  if _ENGINE.value == 'array':
+    print(simulate_array(2, cmds))
+    print(simulate_array(10, cmds))
+    return
+
   chain2 = (Point(0, 0),) * 2
   print(simulate(chain2, cmds))
 
@@ -8,6 +8,10 @@ import numpy as np
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_ENGINE = flags.DEFINE_enum(
+    'engine', 'trace', ['trace', 'callbacks'],
+    'How to run the program. `callbacks` calls the debug and draw callbacks on '
+    'each cycle, `trace` computes the state at every cycle as an array.')
 
 
 class Opcode(enum.StrEnum):
@@ -21,6 +25,11 @@ class Instruction():
   argv: tuple[str, ...] = ()
 
 
+SIMULATION_CYCLES = {
+    Opcode.ADDX: 2,
+    Opcode.NOOP: 1,
+}
+
 # Represents the state of the VM.
 # In this problem it is a simple variable.
 State = int
@@ -56,13 +65,8 @@ def simulate(
       Opcode.NOOP: noop,
   }
 
-  simulation_cycles = {
-      Opcode.ADDX: 2,
-      Opcode.NOOP: 1,
-  }
-
   for i in instructions:
-    num_cycles = simulation_cycles[i.opcode]
+    num_cycles = SIMULATION_CYCLES[i.opcode]
     for _ in range(num_cycles):
       for callback in callbacks:
         callback(state)
@@ -72,6 +76,27 @@ def simulate(
   return state
 
 
+def trace(instructions: Sequence[Instruction], state: State) -> np.ndarray:
+  """Returns the state of the VM during each cycle.
+
+  Same as recording the state passed to the callbacks of `simulate`. Each
+  `addx` adds its argument to the state from the cycle after it ends, so the
+  trace is a cumulative sum of the arguments placed at these cycles.
+  """
+  num_cycles = np.array([SIMULATION_CYCLES[i.opcode] for i in instructions],
+                        dtype=np.int64)
+  args = np.array(
+      [int(i.argv[0]) if i.opcode == Opcode.ADDX else 0 for i in instructions],
+      dtype=np.int64)
+
+  # `deltas[c]` is what's added to the state at the start of cycle `c`.
+  deltas = np.zeros([np.sum(num_cycles) + 1], dtype=np.int64)
+  deltas[0] = state
+  deltas[np.cumsum(num_cycles)] = args
+
+  return np.cumsum(deltas)[:-1]
+
+
 def parse(path: str) -> Sequence[Instruction]:
   with open(path) as f:
     lines = f.read().splitlines()
@@ -89,6 +114,30 @@ def parse(path: str) -> Sequence[Instruction]:
 def main(argv):
   instructions = parse(_INPUT_FILE.value)
 
+  WINDOW_HEIGHT = 6
+  WINDOW_WIDTH = 40
+
+  if _ENGINE.value == 'trace':
+    xs = trace(instructions, state=State(1))
+    cycles = np.arange(1, xs.size + 1)
+
+    # Part 1.
+    # The signal strength is measured during the 20th cycle and every 40
+    # cycles after that.
+    print(int(np.dot(cycles[19::40], xs[19::40])))
+
+    # Part 2.
+    # The CRT draws a pixel per cycle, row by row. A pixel is emitted if the 3
+    # pixel wide sprite at `[state - 1, state + 1]` covers its column.
+    # Pixels after the end of the program stay dark.
+    cols = np.arange(WINDOW_HEIGHT * WINDOW_WIDTH) % WINDOW_WIDTH
+    n = min(xs.size, cols.size)
+    crt = np.zeros(cols.size, dtype=bool)
+    crt[:n] = np.abs(xs[:n] - cols[:n]) <= 1
+    for row in crt.reshape(WINDOW_HEIGHT, WINDOW_WIDTH):
+      print(''.join('#' if lit else '.' for lit in row))
+    return
+
   cpu_counter, signal_strength = 0, 0
 
   def debug_fn(s: State):
@@ -97,8 +146,6 @@ def main(argv):
     if ((cpu_counter - 20) % 40 == 0):
       signal_strength += cpu_counter * s
 
-  WINDOW_HEIGHT = 6
-  WINDOW_WIDTH = 40
   crt = np.zeros([WINDOW_HEIGHT, WINDOW_WIDTH], dtype=bool)
   crt_counter = 0
 
@@ -6,53 +6,87 @@ import copy
 import dataclasses
 import heapq
 import math
-import functools
 import more_itertools
+import numpy as np
 import operator
 import re
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_ENGINE = flags.DEFINE_enum(
+    'engine', 'batch', ['batch', 'cycles', 'items'],
+    'How to simulate the rounds. `items` moves the items one by one, `batch` '
+    'updates all the items of a monkey at once with NumPy and `cycles` follows '
+    'each item until its trajectory repeats.')
+_ROUNDS = flags.DEFINE_integer('rounds', 10000, 'Number of rounds to simulate.')
 
 
-class ModedInt():
-  """A moded int allows simple modular arithmetic (e.g, `+`, `*`) on big integers.
+class ResidueInt():
+  """An int stored as its residues modulo a fixed set of moduli.
 
-  Operations on a `ModedInt` are themselves `ModedInt`s. To get the result of computation
-  as a Python int, use the builtin modulo operator `%`.
+  Supports simple modular arithmetic (e.g, `+`, `*`) on big integers in constant
+  space. To get the result of a computation modulo one of the moduli, use the
+  builtin modulo operator `%`.
 
-  >>> m = (ModedInt(5) * 6) * ModedInt(2) # (5 * 6) * 2 = 60
+  >>> m = (ResidueInt(5, (6, 7)) * 6) * ResidueInt(2, (6, 7)) # (5 * 6) * 2 = 60
   >>> m % 6
   0
+  >>> m % 7
+  4
   """
 
-  def __init__(self, x: int):
-    self._x = lambda mod: x % mod
+  __slots__ = ('moduli', 'residues')
+
+  def __init__(self, x: int, moduli: tuple[int, ...]):
+    self.moduli = moduli
+    self.residues = tuple(x % mod for mod in moduli)
+
+  def _with_residues(self, residues: tuple[int, ...]) -> 'ResidueInt':
+    r = ResidueInt.__new__(ResidueInt)
+    r.moduli = self.moduli
+    r.residues = residues
+    return r
 
   def __add__(self, other):
     if isinstance(other, int):
-      other = ModedInt(other)
+      other = ResidueInt(other, self.moduli)
+    assert self.moduli == other.moduli
 
-    md = ModedInt(0)
-    md._x = functools.lru_cache()(lambda mod:
-                                  (self._x(mod) + other._x(mod)) % mod)
-    return md
+    residues = zip(self.residues, other.residues, self.moduli)
+    return self._with_residues(tuple((a + b) % mod for (a, b, mod) in residues))
 
   def __mul__(self, other):
     if isinstance(other, int):
-      other = ModedInt(other)
+      other = ResidueInt(other, self.moduli)
+    assert self.moduli == other.moduli
 
-    md = ModedInt(0)
-    md._x = functools.lru_cache()(lambda mod:
-                                  (self._x(mod) * other._x(mod)) % mod)
-    return md
+    residues = zip(self.residues, other.residues, self.moduli)
+    return self._with_residues(tuple((a * b) % mod for (a, b, mod) in residues))
+
+  __radd__ = __add__
+  __rmul__ = __mul__
 
   def __mod__(self, mod):
     assert isinstance(mod, int)
-    return self._x(mod)
+    return self.residues[self.moduli.index(mod)]
+
+  def __int__(self) -> int:
+    """Returns the smallest non-negative int with the same residues.
 
+    Uses the chinese remainder theorem, the result is below the LCM of the
+    moduli.
+    """
+    x, m = 0, 1
+    for (r, mod) in zip(self.residues, self.moduli):
+      # Find `x + m * t` that is `r` modulo `mod`.
+      g = math.gcd(m, mod)
+      assert (r - x) % g == 0
+      t = ((r - x) // g) * pow(m // g, -1, mod // g) % (mod // g)
+      x, m = x + m * t, math.lcm(m, mod)
+    return x
 
-IntLike = Union[int, ModedInt]
+
+IntLike = Union[int, ResidueInt]
 OperationFn = Callable[[IntLike], IntLike]
 TestFn = Callable[[IntLike], int]
 
@@ -62,6 +96,8 @@ class Monkey():
   items: list[IntLike]
   opfn: OperationFn
   testfn: TestFn
+  divisor: int  # `testfn` tests for divisibility by `divisor`.
+  targets: tuple[int, int]  # Where `testfn` throws to if divisible or not.
   num_items_inspected: int = 0
 
 
@@ -72,14 +108,26 @@ def parse(path: str) -> Sequence[Monkey]:
   is_empty_line = lambda s: s == ''
   grps = more_itertools.split_at(lines, is_empty_line)
 
-  def parse_items(s: str) -> list[IntLike]:
-    return [ModedInt(int(e)) for e in s.split(', ')]
+  def parse_items(s: str, moduli: tuple[int, ...]) -> list[IntLike]:
+    return [ResidueInt(int(e), moduli) for e in s.split(', ')]
 
   def make_operation_fn(expr: str) -> OperationFn:
+    """Returns a function evaluating `expr`, without parsing it on each call."""
+    match expr.split():
+      case ['old', '*', 'old']:
+        return lambda old: old * old
+      case ['old', '+', x] if x.isdigit():
+        c = int(x)
+        return lambda old: old + c
+      case ['old', '*', x] if x.isdigit():
+        c = int(x)
+        return lambda old: old * c
+
+    # Any other expression is compiled once.
+    code = compile(expr, '<operation>', 'eval')
 
     def fn(old: IntLike) -> int:
-      nonlocal expr
-      return eval(expr)
+      return eval(code, {}, {'old': old})
 
     return fn
 
@@ -94,7 +142,7 @@ def parse(path: str) -> Sequence[Monkey]:
 
     return fn
 
-  def parse_monkey_specs(lines: str) -> Monkey:
+  def parse_monkey_specs(lines: str) -> re.Match:
     TEMPLATE = r'''Monkey \d+:
   Starting items: (.*)
   Operation: new = (.*)
@@ -104,11 +152,21 @@ def parse(path: str) -> Sequence[Monkey]:
 
     m = re.fullmatch(TEMPLATE, '\n'.join(lines))
     assert m
-    return Monkey(items=parse_items(m[1]),
-                  opfn=make_operation_fn(m[2]),
-                  testfn=make_test_fn(int(m[3]), int(m[4]), int(m[5])))
+    return m
+
+  specs = [parse_monkey_specs(grp) for grp in grps]
+
+  # Items are only ever tested for divisibility by these.
+  moduli = tuple(int(m[3]) for m in specs)
 
-  return [parse_monkey_specs(grp) for grp in grps]
+  return [
+      Monkey(items=parse_items(m[1], moduli),
+             opfn=make_operation_fn(m[2]),
+             testfn=make_test_fn(int(m[3]), int(m[4]), int(m[5])),
+             divisor=int(m[3]),
+             targets=(int(m[4]), int(m[5])))
+      for m in specs
+  ]
 
 
 def simulate_turn(monkeys: list[Monkey], turn_idx: int) -> list[Monkey]:
@@ -132,14 +190,105 @@ def simulate_round(monkeys: list[Monkey]) -> list[Monkey]:
   return monkeys
 
 
+def simulate_batch(monkeys: list[Monkey], num_rounds: int) -> list[int]:
+  """Returns how many items each monkey inspects in `num_rounds` rounds.
+
+  All the items live in two arrays: their worry level modulo the LCM of the
+  divisors and the monkey holding them. On each turn, the items of a monkey
+  are updated at once. The monkeys are not modified.
+  """
+  lcm = math.lcm(*(m.divisor for m in monkeys))
+  # Worry levels are squared at most before taking the modulo.
+  assert (lcm - 1)**2 <= np.iinfo(np.int64).max
+
+  worry = np.array([int(itm) % lcm for m in monkeys for itm in m.items],
+                   dtype=np.int64)
+  owner = np.array([i for (i, m) in enumerate(monkeys) for _ in m.items],
+                   dtype=np.int32)
+
+  counts = [m.num_items_inspected for m in monkeys]
+  for _ in range(num_rounds):
+    for (i, m) in enumerate(monkeys):
+      held = np.flatnonzero(owner == i)
+      if held.size == 0:
+        continue
+      counts[i] += held.size
+
+      w = m.opfn(worry[held]) % lcm
+      worry[held] = w
+      owner[held] = np.where(w % m.divisor == 0, *m.targets)
+
+  return counts
+
+
+def count_inspections_with_cycles(monkeys: list[Monkey],
+                                  num_rounds: int) -> list[int]:
+  """Same as `simulate_batch`, in time independent of `num_rounds`.
+
+  Items don't interact, and the round of an item only depends on the monkey
+  holding it and its worry level modulo the LCM of the divisors. So each item
+  eventually repeats a state it was in at the start of an earlier round, and
+  from then on repeats the same rounds forever.
+  """
+  lcm = math.lcm(*(m.divisor for m in monkeys))
+
+  def simulate_item_round(owner: int, w: int) -> tuple[int, int, list[int]]:
+    """Returns the item state after a round, and the monkeys inspecting it."""
+    inspectors = []
+    while True:
+      m = monkeys[owner]
+      inspectors.append(owner)
+      w = m.opfn(w) % lcm
+      to = m.testfn(w)
+      if to < owner:
+        # Thrown to a monkey done with this round.
+        return to, w, inspectors
+      owner = to
+
+  counts = [m.num_items_inspected for m in monkeys]
+  for (i, m) in enumerate(monkeys):
+    for itm in m.items:
+      state = (i, int(itm) % lcm)
+      seen = {}  # Round at which each state was seen.
+      history = []  # Monkeys inspecting the item at each round.
+      while len(history) < num_rounds and state not in seen:
+        seen[state] = len(history)
+        owner, w, inspectors = simulate_item_round(*state)
+        state = (owner, w)
+        history.append(inspectors)
+
+      rounds = history
+      if len(history) < num_rounds:
+        # Rounds `start` and `len(history)` start in the same state.
+        start = seen[state]
+        cycle = history[start:]
+        num_cycles, rest = divmod(num_rounds - len(history), len(cycle))
+        for inspectors in cycle:
+          for j in inspectors:
+            counts[j] += num_cycles
+        rounds = history + cycle[:rest]
+
+      for inspectors in rounds:
+        for j in inspectors:
+          counts[j] += 1
+
+  return counts
+
+
 def main(argv):
   monkeys = parse(_INPUT_FILE.value)
 
-  for _ in range(10000):
-    monkeys = simulate_round(monkeys)
-
-  num_itms_insepected_key = operator.attrgetter('num_items_inspected')
-  print(math.prod(heapq.nlargest(2, map(num_itms_insepected_key, monkeys))))
+  num_rounds = _ROUNDS.value
+  if _ENGINE.value == 'batch':
+    counts = simulate_batch(monkeys, num_rounds)
+  elif _ENGINE.value == 'cycles':
+    counts = count_inspections_with_cycles(monkeys, num_rounds)
+  else:
+    for _ in range(num_rounds):
+      monkeys = simulate_round(monkeys)
+    counts = list(map(operator.attrgetter('num_items_inspected'), monkeys))
+
+  print(math.prod(heapq.nlargest(2, counts)))
 
 
 if __name__ == '__main__':
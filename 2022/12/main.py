@@ -2,12 +2,20 @@ from absl import app
 from absl import flags
 from collections import namedtuple
 from typing import Sequence
+from common import grid
 
-import collections
+import hashlib
+import heapq
 import numpy as np
+import os
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_CACHE_DIR = flags.DEFINE_string(
+    'cache_dir', None,
+    'Where to cache the distances to the target. No caching if unset.')
+_QUERIES = flags.DEFINE_multi_string(
+    'query', [], 'Start points, as `x,y`, to print the distance to E from.')
 
 
 class Point(namedtuple('Point', 'x y')):
@@ -21,90 +29,172 @@ Target = Point
 
 
 def parse(path: str) -> tuple[np.ndarray, Start, Target]:
-  with open(path) as f:
-    lines = f.read().splitlines()
+  chars = grid.read_grid(path)
+
+  [start] = np.argwhere(chars == ord('S'))
+  [target] = np.argwhere(chars == ord('E'))
+
+  mp = chars.copy()
+  mp[tuple(start)] = ord('a')
+  mp[tuple(target)] = ord('z')
+  mp -= ord('a')
+
+  return mp, Point(*start.tolist()), Point(*target.tolist())
+
+
+def bfs(
+    heightmap: np.ndarray,
+    sources: np.ndarray,
+    *,
+    reverse: bool = False,
+) -> np.ndarray:
+  """Returns the shortest distance from `sources` to all the points in the map.
+
+  The search expands the whole frontier at once, one level at a time.
+
+  Argv:
+    heightmap: the elevation of each point.
+    sources: a boolean mask of the points to start from.
+    reverse: if set, moves are followed backwards. That is, the result is the
+      shortest distance from each point to the closest source.
+
+  Returns:
+    An int32 array of distances, -1 for points that can't be reached.
+  """
+  h = heightmap.astype(np.int16)
+  if reverse:
+    h = -h  # Going down by at most 1 is going up by at most 1 in reverse.
+
+  # `can_move[k]` tells whether one can move from a point to its neighbor, for
+  # each direction below. A move to a point at most 1 higher is valid.
+  #   0: (i, j) -> (i + 1, j)    1: (i + 1, j) -> (i, j)
+  #   2: (i, j) -> (i, j + 1)    3: (i, j + 1) -> (i, j)
+  can_move = [
+      h[1:, :] <= h[:-1, :] + 1,
+      h[:-1, :] <= h[1:, :] + 1,
+      h[:, 1:] <= h[:, :-1] + 1,
+      h[:, :-1] <= h[:, 1:] + 1,
+  ]
+
+  dists = np.full(heightmap.shape, -1, dtype=np.int32)
+  frontier = sources.copy()
+  dists[frontier] = 0
+  level = 0
+  while frontier.any():
+    level += 1
+    reached = np.zeros_like(frontier)
+    reached[1:, :] |= frontier[:-1, :] & can_move[0]
+    reached[:-1, :] |= frontier[1:, :] & can_move[1]
+    reached[:, 1:] |= frontier[:, :-1] & can_move[2]
+    reached[:, :-1] |= frontier[:, 1:] & can_move[3]
+
+    frontier = reached & (dists < 0)
+    dists[frontier] = level
 
-  def height(ch: str) -> int:
-    if ch == 'S':
-      return height('a')
-    if ch == 'E':
-      return height('z')
-    return ord(ch) - ord('a')
-
-  n, m = len(lines), len(lines[0])
-  mp = np.zeros([n, m], dtype=np.int32)
-  start, target = None, None
-  for i in range(n):
-    for j in range(m):
-      ch = lines[i][j]
-      mp[i, j] = height(ch)
-      if ch == 'S':
-        start = Point(i, j)
-      elif ch == 'E':
-        target = Point(i, j)
-
-  assert start and target
-
-  return mp, start, target
+  return dists
 
 
-def bfs(heightmap: np.ndarray, start: Point) -> np.ndarray:
+def shortest_path(heightmap: np.ndarray, start: Point,
+                  target: Point) -> Sequence[Point] | None:
+  """Returns a shortest path from `start` to `target`, both included.
 
-  def is_out_of_bound(p: Point) -> bool:
-    nonlocal heightmap
-    n, m = heightmap.shape
-    x, y = p
-    return (x < 0 or x >= n) or (y < 0 or y >= m)
+  A* search that stops as soon as the target is reached. Returns None if the
+  target can't be reached.
+  """
+  n, m = heightmap.shape
+  hs = heightmap.tolist()  # Indexing numpy arrays point by point is slow.
 
-  def is_valid_move(*, frm: Point, to: Point) -> bool:
-    return heightmap[frm] <= heightmap[to] + 1
+  def heuristic(p: Point) -> int:
+    # Each move climbs at most 1, so both bounds are admissible (and
+    # consistent).
+    return max(
+        abs(p.x - target.x) + abs(p.y - target.y),
+        hs[target.x][target.y] - hs[p.x][p.y],
+    )
 
   MOVES = [Point(0, 1), Point(1, 0), Point(-1, 0), Point(0, -1)]
 
-  q = collections.deque()
-  seen = set()
-  dists = np.full(heightmap.shape, np.inf)
-
-  q.append(start)
-  seen.add(start)
-  dists[start] = 0
+  came_from = {start: None}
+  dists = {start: 0}
+  q = [(heuristic(start), 0, start)]
   while q:
-    u = q.popleft()
+    _, d, u = heapq.heappop(q)
+    if u == target:
+      path = []
+      while u is not None:
+        path.append(u)
+        u = came_from[u]
+      return path[::-1]
+
+    if d > dists[u]:
+      continue  # Stale entry.
+
     for mv in MOVES:
       v = u + mv
-      if is_out_of_bound(v):
+      if not (0 <= v.x < n and 0 <= v.y < m):
         continue
-      if v in seen:
+      if hs[v.x][v.y] > hs[u.x][u.y] + 1:
         continue
-      if not is_valid_move(frm=u, to=v):
+      if v in dists and dists[v] <= d + 1:
         continue
-      q.append(v)
-      seen.add(v)
-      dists[v] = 1 + dists[u]
-
+      dists[v] = d + 1
+      came_from[v] = u
+      heapq.heappush(q, (d + 1 + heuristic(v), d + 1, v))
+
+  return None
+
+
+def distances_to_target(
+    path: str,
+    heightmap: np.ndarray,
+    target: Point,
+    cache_dir: str | None = None,
+) -> np.ndarray:
+  """Returns the shortest distance from every point to `target`.
+
+  The result only depends on the input file, so it is cached in `cache_dir`
+  under the hash of the file contents.
+  """
+
+  def compute() -> np.ndarray:
+    sources = np.zeros(heightmap.shape, dtype=bool)
+    sources[target] = True
+    return bfs(heightmap, sources, reverse=True)
+
+  if cache_dir is None:
+    return compute()
+
+  with open(path, 'rb') as f:
+    digest = hashlib.sha256(f.read()).hexdigest()
+  cache_path = os.path.join(cache_dir, f'{digest}.npy')
+  if os.path.exists(cache_path):
+    return np.load(cache_path)
+
+  dists = compute()
+  os.makedirs(cache_dir, exist_ok=True)
+  np.save(cache_path, dists)
   return dists
 
 
 def main(argv):
   heightmap, start, target = parse(_INPUT_FILE.value)
 
-  # Shortest distance from the target to all other points in the map.
-  # The operator `shortest distance (SD)` is commutative. That is `SD(a to b)`
-  # is equal to `SD(b to a)`.
-  dists = bfs(heightmap, target)
-
   # Part 1.
   # We look for the shortest path from `start` to `target`.
-  print(dists[start])
+  path = shortest_path(heightmap, start, target)
+  print(len(path) - 1 if path else -1)  # -1 if unreachable, like `bfs`.
 
   # Part 2.
   # We look for the shortest path from any 0 elevation point to `target`.
-  best = np.inf
-  with np.nditer(heightmap, flags=['multi_index']) as it:
-    for h in it:
-      if h == 0:
-        best = min(best, dists[it.multi_index])
-  print(best)
+  dists = bfs(heightmap, heightmap == 0)
+  print(dists[target])
+
+  if _QUERIES.value:
+    dists = distances_to_target(_INPUT_FILE.value, heightmap, target,
+                                _CACHE_DIR.value)
+    for q in _QUERIES.value:
+      p = Point(*map(int, q.split(',')))
+      print(q, dists[p])
 
 
 if __name__ == '__main__':
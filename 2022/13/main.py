@@ -1,20 +1,56 @@
 from absl import app
 from absl import flags
-from typing import Sequence, Union
+from typing import Iterator, Sequence, Union
 
 import functools
 import math
+import re
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_DECODER = flags.DEFINE_enum(
+    'decoder', 'count', ['count', 'sort'],
+    'How to find the divider packets positions. `sort` sorts all the packets, '
+    '`count` counts the packets smaller than each divider packet.')
 
 Packet = Union[int, Sequence['Packet']]
 
 
+# Integers, and any other single char except for separators.
+_TOKEN_REGEX = re.compile(rb'\d+|[^,\s]')
+
+
+def parse_packet(line: bytes) -> Packet:
+  """Parses a packet in a single pass over its tokens."""
+  lists = [[]]  # The lists being built, innermost last.
+  for tok in _TOKEN_REGEX.findall(line):
+    if tok == b'[':
+      lists.append([])
+    elif tok == b']':
+      if len(lists) == 1:
+        raise ValueError(f'Unbalanced packet: {line!r}')
+      l = lists.pop()
+      lists[-1].append(l)
+    elif tok.isdigit():
+      lists[-1].append(int(tok))
+    else:
+      raise ValueError(f'Unexpected token {tok!r} in packet: {line!r}')
+
+  if len(lists) != 1 or len(lists[0]) != 1:
+    raise ValueError(f'Malformed packet: {line!r}')
+  return lists[0][0]
+
+
+def iter_packets(path: str) -> Iterator[Packet]:
+  """Yields the packets in the input file, one line at a time."""
+  with open(path, 'rb') as f:
+    for line in f:
+      if line.strip():
+        yield parse_packet(line)
+
+
 def parse(path: str) -> Sequence[Packet]:
-  with open(path) as f:
-    lines = f.read().splitlines()
-  return [eval(l) for l in lines if l != '']
+  return list(iter_packets(path))
 
 
 def cmp(p0: Packet, p1: Packet):
@@ -40,6 +76,30 @@ def cmp(p0: Packet, p1: Packet):
   return len(p0) - len(p1)
 
 
+def list_depth(p: Packet) -> int:
+  """Returns how deeply lists are nested in `p`, 0 for ints."""
+  if isinstance(p, int):
+    return 0
+  return 1 + max(map(list_depth, p), default=0)
+
+
+def sort_key(p: Packet, depth: int) -> tuple | int:
+  """Returns a key of `p` that Python compares natively the same way as `cmp`.
+
+  `cmp` compares `a` and `[a]` the same way against any packet. So wrapping
+  ints in lists until all of them are `depth` levels deep doesn't change the
+  order, and then `cmp` never compares an int against a list. The remaining
+  comparisons are plain lexicographic ones, like tuples.
+
+  `depth` must be at least the `list_depth` of all the compared packets.
+  """
+  if isinstance(p, int):
+    for _ in range(depth):
+      p = (p,)
+    return p
+  return tuple(sort_key(e, depth - 1) for e in p)
+
+
 def main(argv):
   pkts = parse(_INPUT_FILE.value)
 
@@ -54,11 +114,22 @@ def main(argv):
   # Part 2.
   DIVIDER_PACKETS = ([[[2]], [[6]]])
 
-  pkts.extend(DIVIDER_PACKETS)
-  pkts = sorted(pkts, key=functools.cmp_to_key(cmp))
-
-  decoder_key = math.prod(
-      [i + 1 for i, pkt in enumerate(pkts) if pkt in DIVIDER_PACKETS])
+  depth = max(map(list_depth, pkts + DIVIDER_PACKETS))
+  key = functools.partial(sort_key, depth=depth)
+
+  if _DECODER.value == 'sort':
+    pkts.extend(DIVIDER_PACKETS)
+    pkts = sorted(pkts, key=key)
+
+    decoder_key = math.prod(
+        [i + 1 for i, pkt in enumerate(pkts) if pkt in DIVIDER_PACKETS])
+  else:
+    # The position of a divider packet is one more than the number of packets,
+    # including the other dividers, smaller than it.
+    keys = [key(p) for p in pkts + DIVIDER_PACKETS]
+    divider_keys = [key(d) for d in DIVIDER_PACKETS]
+    decoder_key = math.prod(
+        1 + sum(k < dk for k in keys) for dk in divider_keys)
   print(decoder_key)
 
 
@@ -6,14 +6,16 @@ import collections
 import copy
 import numpy as np
 import itertools
-import operator
+import math
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_FLOOR_MODE = flags.DEFINE_enum(
+    'floor_mode', 'rows', ['rows', 'simulate'],
+    'How to count the sand units when there is a floor. `rows` fills the sand '
+    'row by row, `simulate` drops the units one by one.')
 
 Point = collections.namedtuple('Point', 'x y')
-getx = operator.attrgetter('x')
-gety = operator.attrgetter('y')
 is_point = lambda obj: isinstance(obj, Point)
 
 VOID = 0
@@ -42,13 +44,22 @@ def tree_flatten(tree: Any, is_leaf: Callable[[Any], bool]) -> Any:
       yield from tree_flatten(subtree, is_leaf)
 
 
-def normalize_points(points) -> Sequence[Sequence[Point]]:
-  minx = min(map(getx, tree_flatten(points, is_point)))
-  miny = min(map(gety, tree_flatten(points, is_point)))
+def bounding_box(points) -> tuple[Point, Point]:
+  """Returns the min and max corners of the points."""
+  minx = miny = math.inf
+  maxx = maxy = -math.inf
+  for (x, y) in tree_flatten(points, is_point):
+    minx, maxx = min(minx, x), max(maxx, x)
+    miny, maxy = min(miny, y), max(maxy, y)
+  return Point(minx, miny), Point(maxx, maxy)
 
-  return tree_map(lambda p: Point(p.x - minx, p.y - miny), points, is_point)
 
+def normalize_points(points, origin: Point) -> Sequence[Sequence[Point]]:
+  return tree_map(lambda p: Point(p.x - origin.x, p.y - origin.y), points,
+                  is_point)
 
+
+# Each point holds one of VOID, ROCK, SOURCE or SAND.
 Grid = np.ndarray
 
 
@@ -65,60 +76,37 @@ def parse(path: str) -> Grid:
 
   points = [read_points(l) for l in lines]
   points = points + [Point(500, 0)]  # Add the SOURCE.
-  points = normalize_points(points)
+  lo, hi = bounding_box(points)
+  points = normalize_points(points, lo)
 
-  width = max(map(getx, tree_flatten(points, is_point))) + 1
-  height = max(map(gety, tree_flatten(points, is_point))) + 1
+  width = hi.x - lo.x + 1
+  height = hi.y - lo.y + 1
 
-  mp = np.full([height, width], VOID, dtype=np.int32)
+  mp = np.full([height, width], VOID, dtype=np.uint8)
   for ps in points[:-1]:
     for (a, b) in zip(ps, ps[1:]):
       if a.x == b.x:
         [l, r] = sorted([a.y, b.y])
-        for k in range(l, r + 1):
-          mp[k, a.x] = 1
+        mp[l:r + 1, a.x] = ROCK
       else:
         [l, r] = sorted([a.x, b.x])
-        for k in range(l, r + 1):
-          mp[a.y, k] = 1
+        mp[a.y, l:r + 1] = ROCK
   [srcx, srcy] = points[-1]
   mp[srcy, srcx] = SOURCE
 
   return mp
 
 
-def simulate_sand_unit(grid: Grid, p: Point) -> Point:
-  """Returns where the unit sand `p` will fall."""
-  n, m = grid.shape
-  x, y = p
-
-  while True:
-    if y + 1 >= n:
-      return Point(x, y + 1)
-    elif grid[y + 1, x] == VOID:
-      y += 1
-    elif x - 1 < 0:
-      return Point(x - 1, y + 1)
-    elif grid[y + 1, x - 1] == VOID:
-      x -= 1
-      y += 1
-    elif x + 1 >= m:
-      return Point(x + 1, y + 1)
-    elif grid[y + 1, x + 1] == VOID:
-      x += 1
-      y += 1
-    else:
-      return Point(x, y)
-
-
 def simulate_sand(grid: Grid, add_floor: bool = False) -> Grid:
   grid = copy.copy(grid)
 
   if add_floor:
     n, m = grid.shape
-    mp = np.full([n + 2, m + 2 * n], VOID, dtype=np.int32)
-    mp[:n, n:n + m] = grid
-    mp[n + 1, :] = np.full([1, m + 2 * n], ROCK, dtype=np.int32)
+    # Sand spreads at most `n` points sideways. One more column on each side
+    # keeps the last units from being taken as falling out of bound.
+    mp = np.full([n + 2, m + 2 * n + 2], VOID, dtype=np.uint8)
+    mp[:n, n + 1:n + 1 + m] = grid
+    mp[n + 1, :] = ROCK
     grid = mp
 
   n, m = grid.shape
@@ -128,16 +116,24 @@ def simulate_sand(grid: Grid, add_floor: bool = False) -> Grid:
       if grid[i, j] == SOURCE:
         src = Point(j, i)
 
-  while True:
-    p = simulate_sand_unit(grid, src)
-    if p.x < 0 or p.x >= m or p.y >= n:
-      # Out of bound.
-      break
-    grid[p.y, p.x] = SAND
-    if p == src:
-      # No new sand unit can come out.
-      break
+  # The path of the last unit of sand. The next unit follows the same path until
+  # the last point before the one where the previous unit settled, so it starts
+  # from there instead of from the source.
+  path = [src]
+  while path:
+    x, y = path[-1]
+    for dx in (0, -1, 1):
+      if y + 1 >= n or not (0 <= x + dx < m):
+        # Out of bound, so are all the following units.
+        return grid
+      if grid[y + 1, x + dx] == VOID:
+        path.append(Point(x + dx, y + 1))
+        break
+    else:
+      grid[y, x] = SAND
+      path.pop()
 
+  # No new sand unit can come out.
   return grid
 
 
@@ -145,11 +141,40 @@ def num_sand_units(grid: np.ndarray) -> int:
   return np.sum(np.where(grid == SAND, 1, 0))
 
 
+def num_sand_units_with_floor(grid: Grid) -> int:
+  """Same as `num_sand_units(simulate_sand(grid, add_floor=True))`.
+
+  With a floor, sand piles up until it blocks the source, so every point that
+  sand can reach ends up with sand. That is, a point has sand iff it is not a
+  rock and one of the three points above it has sand.
+  """
+  n, m = grid.shape
+  [[srcy, srcx]] = np.argwhere(grid == SOURCE)
+
+  # The floor is at `n + 1`, so sand spreads at most `n` points sideways.
+  row = np.zeros([m + 2 * n], dtype=bool)
+  row[n + srcx] = True
+  count = 1
+  for y in range(srcy + 1, n + 1):
+    above = row
+    row = above.copy()
+    row[1:] |= above[:-1]
+    row[:-1] |= above[1:]
+    if y < n:
+      row[n:n + m] &= grid[y] != ROCK
+    count += np.count_nonzero(row)
+
+  return count
+
+
 def main(argv):
   grid = parse(_INPUT_FILE.value)
 
   print(num_sand_units(simulate_sand(grid)))
-  print(num_sand_units(simulate_sand(grid, add_floor=True)))
+  if _FLOOR_MODE.value == 'rows':
+    print(num_sand_units_with_floor(grid))
+  else:
+    print(num_sand_units(simulate_sand(grid, add_floor=True)))
 
 
 if __name__ == '__main__':
@@ -3,15 +3,33 @@ from absl import flags
 from typing import Sequence, Iterable
 
 import collections
+import concurrent.futures
 import intervals as I
 import functools
+import numpy as np
 import operator
 import re
+import timeit
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
 _VERBOSE = flags.DEFINE_bool('verbose', False,
                              'Include extra information during execution.')
+_SEARCH = flags.DEFINE_enum(
+    'search', 'perimeter', ['perimeter', 'scan'],
+    'How to find the distress beacon in part 2. `perimeter` only checks the '
+    'points just outside of the sensors ranges, `scan` checks every row.')
+_INTERVALS = flags.DEFINE_enum(
+    'intervals', 'sweep', ['sweep', 'library'],
+    'How to compute the covered part of a row. `sweep` sorts and merges NumPy '
+    'ranges, `library` uses the `python-intervals` package.')
+_BENCHMARK = flags.DEFINE_bool(
+    'benchmark', False, 'Time the interval engines on the part 1 row.')
+_WORKERS = flags.DEFINE_integer(
+    'workers', 1, 'Number of processes sharing the rows with `--search=scan`. '
+    'Not supported with `--search=perimeter`.')
+_BOUND = flags.DEFINE_integer(
+    'bound', 4000000, 'The distress beacon is in `[0, bound] x [0, bound]`.')
 
 
 class Point(collections.namedtuple('Point', 'x y')):
@@ -72,6 +90,8 @@ def merge_intervals(intervals: Iterable[I.Interval]) -> I.Interval:
 def interval_len(i: I.Interval) -> int:
   length = 0
   for j in i:
+    if j.is_empty():
+      continue
     width = j.upper - j.lower + 1
     if not j.left:
       width -= 1
@@ -81,26 +101,76 @@ def interval_len(i: I.Interval) -> int:
   return length
 
 
-def singleton(i: I.Interval) -> int:
-  """Returns the only point in the input interval.
+def sensor_arrays(sensors: Sensors,
+                  beacons: Beacons) -> tuple[np.ndarray, np.ndarray]:
+  """Returns the sensors positions as a `k x 2` array and their radii."""
+  positions = np.array(sensors, dtype=np.int64).reshape(-1, 2)
+  radii = np.array([dist(s, b) for (s, b) in zip(sensors, beacons)],
+                   dtype=np.int64)
+  return positions, radii
 
-  The funtion fails if the interval does not contain exactly one point.
+
+def merge_ranges(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+  """Merges the closed ranges `[lo[i], hi[i]]` into an `m x 2` array.
+
+  Rows of the result are sorted and disjoint, and two rows are never adjacent
+  (e.g., `[1, 2]` and `[3, 4]` are merged as `[1, 4]`).
   """
-  l, r = i.lower, i.upper
-  if not i.left:
-    l += 1
-  if not i.right:
-    r -= 1
+  if lo.size == 0:
+    return np.zeros([0, 2], dtype=np.int64)
 
-  assert l == r
-  return l
+  order = np.argsort(lo)
+  lo, hi = lo[order], hi[order]
 
+  # A range starts a new merged range iff it begins after the end of all the
+  # ranges before it.
+  reach = np.maximum.accumulate(hi)
+  starts = np.flatnonzero(np.r_[True, lo[1:] > reach[:-1] + 1])
+  ends = np.r_[starts[1:] - 1, lo.size - 1]
+  return np.stack([lo[starts], reach[ends]], axis=1)
 
-def main(argv):
-  sensors, beacons = parse(_INPUT_FILE.value)
 
-  # Part 1.
-  yline = 2000000
+def nobeacon_ranges(positions: np.ndarray, radii: np.ndarray,
+                    yline: int) -> np.ndarray:
+  """Same as merging `nobeacon_interval`s, but as `merge_ranges` does."""
+  rad = radii - np.abs(positions[:, 1] - yline)
+  xs = positions[rad >= 0, 0]
+  rad = rad[rad >= 0]
+  return merge_ranges(xs - rad, xs + rad)
+
+
+def ranges_len(ranges: np.ndarray) -> int:
+  return int(np.sum(ranges[:, 1] - ranges[:, 0] + 1))
+
+
+def ranges_contain(ranges: np.ndarray, x: int) -> bool:
+  return bool(np.any((ranges[:, 0] <= x) & (x <= ranges[:, 1])))
+
+
+def ranges_gaps(ranges: np.ndarray, lo: int, hi: int) -> np.ndarray:
+  """Returns the ranges of points in `[lo, hi]` not covered by `ranges`."""
+  ranges = np.clip(ranges, lo - 1, hi + 1)
+  bounds = np.r_[lo - 1, ranges.reshape(-1), hi + 1].reshape(-1, 2)
+  gaps = np.stack([bounds[:, 0] + 1, bounds[:, 1] - 1], axis=1)
+  return gaps[gaps[:, 0] <= gaps[:, 1]]
+
+
+def first_point(i: I.Interval) -> int | None:
+  """Returns the smallest integer point in the input interval, if any."""
+  for j in i:
+    l, r = j.lower, j.upper
+    if not j.left:
+      l += 1
+    if not j.right:
+      r -= 1
+    if l <= r:
+      return l
+  return None
+
+
+def count_nobeacon_library(sensors: Sensors, beacons: Beacons,
+                           yline: int) -> int:
+  """Counts the points on `yline` where no beacon can exist."""
   intervals = [
       nobeacon_interval(sensor=s, beacon=b, yline=yline)
       for (s, b) in zip(sensors, beacons)
@@ -110,28 +180,210 @@ def main(argv):
     if y == yline:
       u -= I.closed(x, x)
 
-  print(interval_len(u))
+  return interval_len(u)
 
-  # Part 2.
-  n = 4000000
-  for y in range(n + 1):
-    if _VERBOSE.value and (y % 10000 == 0):
+
+def count_nobeacon_sweep(sensors: Sensors, beacons: Beacons,
+                         yline: int) -> int:
+  """Same as `count_nobeacon_library`."""
+  ranges = nobeacon_ranges(*sensor_arrays(sensors, beacons), yline)
+  beacons_on_line = {x for (x, y) in beacons if y == yline}
+  return ranges_len(ranges) - sum(
+      1 for x in beacons_on_line if ranges_contain(ranges, x))
+
+
+def scan_rows(
+    sensors: Sensors,
+    beacons: Beacons,
+    n: int,
+    *,
+    rows: range | None = None,
+    engine: str = 'sweep',
+    verbose: bool = False,
+) -> Point | None:
+  """Returns the first point in `[0, n] x [0, n]` not covered by any sensor.
+
+  Checks the rows one by one, only the ones in `rows` if given. This reads no
+  flags so it can run in worker processes.
+  """
+  if rows is None:
+    rows = range(n + 1)
+
+  if engine == 'library':
+
+    def find_gap(y: int) -> int | None:
+      intervals = [
+          nobeacon_interval(sensor=s, beacon=b, yline=y)
+          for (s, b) in zip(sensors, beacons)
+      ]
+
+      u = merge_intervals(intervals)
+      u &= I.closed(0, n)  # Clip to [0, n].
+
+      if u == I.closed(0, n):
+        return None
+      # Get the first point not covered by the interval u. The complement
+      # can have open pieces without integer points, e.g. `(3, 4)` between
+      # `[0, 3]` and `[4, n]`.
+      u = ~u & I.closed(0, n)
+      return first_point(u)
+
+  else:
+    positions, radii = sensor_arrays(sensors, beacons)
+
+    def find_gap(y: int) -> int | None:
+      gaps = ranges_gaps(nobeacon_ranges(positions, radii, y), 0, n)
+      if gaps.size == 0:
+        return None
+      return int(gaps[0, 0])
+
+  for y in rows:
+    if verbose and (y % 10000 == 0):
       print('Iteration ', y)
 
-    intervals = [
-        nobeacon_interval(sensor=s, beacon=b, yline=y)
-        for (s, b) in zip(sensors, beacons)
+    x = find_gap(y)
+    if x is not None:
+      return Point(x, y)
+
+  return None
+
+
+def scan_rows_parallel(
+    sensors: Sensors,
+    beacons: Beacons,
+    n: int,
+    *,
+    workers: int,
+    engine: str = 'sweep',
+    verbose: bool = False,
+) -> Point | None:
+  """Same as `scan_rows`, but shards the rows between `workers` processes."""
+  # Many more chunks than workers, so the pending chunks can be cancelled soon
+  # after a worker finds the point.
+  num_chunks = 16 * workers
+  chunk_size = -(-(n + 1) // num_chunks)
+
+  with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+    futures = [
+        executor.submit(scan_rows,
+                        sensors,
+                        beacons,
+                        n,
+                        rows=range(lo, min(lo + chunk_size, n + 1)),
+                        engine=engine,
+                        verbose=verbose)
+        for lo in range(0, n + 1, chunk_size)
     ]
+    # Chunks are checked in order, so the result is the same as `scan_rows`.
+    for f in futures:
+      p = f.result()
+      if p is not None:
+        # Only waits for the chunks already being scanned.
+        executor.shutdown(wait=False, cancel_futures=True)
+        return p
 
-    u = merge_intervals(intervals)
-    u &= I.closed(0, n)  # Clip to [0, n].
+  return None
 
-    if u != I.closed(0, n):
-      # Get the singleton point not covered by the interval u.
-      u = ~u & I.closed(0, n)
-      x = singleton(u)
-      print(x * n + y)
-      break
+
+def search_perimeters(
+    sensors: Sensors,
+    beacons: Beacons,
+    n: int,
+    *,
+    verbose: bool = False,
+) -> Point | None:
+  """Returns the only point in `[0, n] x [0, n]` not covered by any sensor.
+
+  If there is a single uncovered point, then its neighbors in the search area
+  are covered. So it lies just outside the range of some sensor, on the
+  boundary of the diamond of radius `rad + 1` around it. The sides of such
+  diamond are on the lines `x + y = a` and `x - y = b`, so the point is found
+  by looking for gaps in the sensors coverage along each of these lines.
+
+  With `u = x + y` and `v = x - y`, a sensor covers the points with
+  `|u - su| <= rad` and `|v - sv| <= rad`. So on the line `u = a`, it covers
+  either nothing or the range `[sv - rad, sv + rad]` of `v`s (and vice versa).
+  """
+  positions, radii = sensor_arrays(sensors, beacons)
+  us = positions[:, 0] + positions[:, 1]
+  vs = positions[:, 0] - positions[:, 1]
+
+  def find_gap(line: int, across: np.ndarray, along: np.ndarray, lo: int,
+               hi: int) -> int | None:
+    """Returns an uncovered coordinate in `[lo, hi]` along a line.
+
+    Only coordinates with the same parity as `line` are points of the grid.
+    """
+    if lo > hi:
+      return None
+    covering = np.abs(across - line) <= radii
+    ranges = merge_ranges(along[covering] - radii[covering],
+                          along[covering] + radii[covering])
+    for (l, h) in ranges_gaps(ranges, lo, hi).tolist():
+      w = l + (l - line) % 2
+      if w <= h:
+        return w
+    return None
+
+  a_coeffs = sorted(set((us - radii - 1).tolist() + (us + radii + 1).tolist()))
+  b_coeffs = sorted(set((vs - radii - 1).tolist() + (vs + radii + 1).tolist()))
+  if verbose:
+    print('Lines ', len(a_coeffs) + len(b_coeffs))
+
+  # Bounds of `v` on `x + y = a`, and of `u` on `x - y = b`, so that both
+  # `x = (u + v) / 2` and `y = (u - v) / 2` are within `[0, n]`.
+  for a in a_coeffs:
+    v = find_gap(a, us, vs, max(-a, a - 2 * n), min(a, 2 * n - a))
+    if v is not None:
+      return Point((a + v) // 2, (a - v) // 2)
+  for b in b_coeffs:
+    u = find_gap(b, vs, us, max(b, -b), min(2 * n + b, 2 * n - b))
+    if u is not None:
+      return Point((u + b) // 2, (u - b) // 2)
+
+  return None
+
+
+def main(argv):
+  sensors, beacons = parse(_INPUT_FILE.value)
+
+  # Part 1.
+  yline = 2000000
+  count_nobeacon = count_nobeacon_sweep
+  if _INTERVALS.value == 'library':
+    count_nobeacon = count_nobeacon_library
+
+  if _BENCHMARK.value:
+    for fn in (count_nobeacon_library, count_nobeacon_sweep):
+      t = timeit.timeit(lambda: fn(sensors, beacons, yline), number=1000)
+      print(f'{fn.__name__}: {t:.3f} ms per row')
+
+  print(count_nobeacon(sensors, beacons, yline))
+
+  # Part 2.
+  if _WORKERS.value > 1 and _SEARCH.value != 'scan':
+    raise app.UsageError('`--workers` requires `--search=scan`.')
+
+  n = _BOUND.value
+  if _SEARCH.value == 'perimeter':
+    p = search_perimeters(sensors, beacons, n, verbose=_VERBOSE.value)
+  elif _WORKERS.value > 1:
+    p = scan_rows_parallel(sensors,
+                           beacons,
+                           n,
+                           workers=_WORKERS.value,
+                           engine=_INTERVALS.value,
+                           verbose=_VERBOSE.value)
+  else:
+    p = scan_rows(sensors,
+                  beacons,
+                  n,
+                  engine=_INTERVALS.value,
+                  verbose=_VERBOSE.value)
+
+  assert p is not None, 'No distress beacon found.'
+  x, y = p
+  print(x * 4000000 + y)
 
 
 if __name__ == '__main__':
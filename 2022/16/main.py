@@ -2,13 +2,17 @@ from absl import app
 from absl import flags
 from typing import Sequence
 
-import collections
 import dataclasses
 import functools
+import numpy as np
 import re
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_SOLVER = flags.DEFINE_enum(
+    'solver', 'subsets', ['subsets', 'recursive'],
+    'How to search for the best flow. `recursive` is the original memoized '
+    'search over all agents, kept around for cross-checking.')
 
 
 @dataclasses.dataclass(frozen=True)
@@ -18,7 +22,11 @@ class Valve():
   neighbors: tuple[str, ...]
 
 
-def parse(path: str) -> Sequence[Valve]:
+def parse(path: str) -> tuple[Sequence[Valve], np.ndarray]:
+  """Returns the valves and their adjacency matrix.
+
+  Row and column `i` of the matrix correspond to `valves[i]`.
+  """
   with open(path) as f:
     lines = f.read().splitlines()
 
@@ -33,89 +41,203 @@ def parse(path: str) -> Sequence[Valve]:
         neighbors=tuple(ns.split(', ')),
     )
 
-  return [parse_valve(l) for l in lines]
+  valves = [parse_valve(l) for l in lines]
 
+  valve_to_idx = {v.name: i for (i, v) in enumerate(valves)}
+  adjacency = np.zeros([len(valves), len(valves)], dtype=bool)
+  for (i, v) in enumerate(valves):
+    for n in v.neighbors:
+      adjacency[i, valve_to_idx[n]] = True
 
-def all_pairs_shortest_path(
-    valves: Sequence[Valve]) -> dict[tuple[Valve, Valve], int]:
-  dists = collections.defaultdict(lambda: len(valves) + 1)
+  return valves, adjacency
 
-  for v in valves:
-    dists[(v, v)] = 0
 
-  valve_by_name = {v.name: v for v in valves}
-  for v in valves:
-    for n in v.neighbors:
-      u = valve_by_name[n]
-      dists[(v, u)] = 1
+def all_pairs_shortest_path(adjacency: np.ndarray) -> np.ndarray:
+  n, _ = adjacency.shape
+  # `n` is larger than any shortest path, so it stands for infinity. The sum of
+  # two of them still fits in an int16.
+  assert 2 * n <= np.iinfo(np.int16).max
+  dists = np.where(adjacency, 1, n).astype(np.int16)
+  np.fill_diagonal(dists, 0)
 
-  # Floys Warshall.
-  for k in valves:
-    for i in valves:
-      for j in valves:
-        dists[(i, j)] = min(dists[(i, j)], dists[(i, k)] + dists[(k, j)])
+  # Floyd Warshall, relaxing all the (i, j) pairs through `k` at once.
+  for k in range(n):
+    dists = np.minimum(dists, dists[:, k, None] + dists[None, k, :])
 
   return dists
 
 
-def max_flow(
+@dataclasses.dataclass(frozen=True)
+class ValveGraph():
+  """Complete graph over the valves worth visiting.
+
+  Valves `0..k-1` are the nonzero rate valves, so a set of opened valves is a
+  `k` bit mask. The start valve is either one of them or the last valve.
+  """
+  rates: tuple[int, ...]
+  dists: np.ndarray  # int16 matrix of shortest path lengths.
+  start: int
+
+  @property
+  def num_nonzero_rate_valves(self) -> int:
+    return sum(1 for r in self.rates if r > 0)
+
+
+def compress(
     valves: Sequence[Valve],
+    dists: np.ndarray,
     start_valve_idx: int,
+) -> ValveGraph:
+  """Drops the zero rate valves, except for the start valve."""
+  keep = [i for (i, v) in enumerate(valves) if v.rate > 0]
+  if start_valve_idx not in keep:
+    keep.append(start_valve_idx)
+
+  return ValveGraph(
+      rates=tuple(valves[i].rate for i in keep),
+      dists=dists[np.ix_(keep, keep)],
+      start=keep.index(start_valve_idx),
+  )
+
+
+def max_flow(
+    graph: ValveGraph,
     available_time: int,
     num_agents: int,
 ) -> int:
 
   available_time += 1  # Add 1 because we open on the start valve.
-  start_valve = valves[start_valve_idx]
-  dists = all_pairs_shortest_path(valves)
-  nonzero_rate_valves = [v for v in valves if v.rate > 0]
-  valve_to_idx = {v: i for (i, v) in enumerate(valves)}
+  k = graph.num_nonzero_rate_valves
+  rates = graph.rates
+  # Plain lists, indexing numpy arrays element by element is slow.
+  dists = graph.dists.tolist()
 
   @functools.cache
-  def go(v: Valve, mask: int, rem_time: int, agent_idx: int) -> int:
-    nonlocal nonzero_rate_valves, dists
-
+  def go(v: int, mask: int, rem_time: int, agent_idx: int) -> int:
     if rem_time <= 0:
       if agent_idx == 0:
         return 0  # Base case.
       # Switch to the next agent.
-      return go(start_valve, mask, available_time, agent_idx - 1)
+      return go(graph.start, mask, available_time, agent_idx - 1)
 
     rem_time -= 1  # 1 unit of time to open the valve.
-    flow = v.rate * rem_time
+    flow = rates[v] * rem_time
 
     best = flow
     if agent_idx > 0:
       # Switch to the next agent.
-      best = flow + go(start_valve, mask, available_time, agent_idx - 1)
+      best = flow + go(graph.start, mask, available_time, agent_idx - 1)
 
-    for vv in nonzero_rate_valves:
-      idx = valve_to_idx[vv]
-      if mask & (1 << idx):
+    for vv in range(k):
+      if mask & (1 << vv):
         continue
-      new_mask = mask | (1 << idx)
-      new_rem_time = rem_time - dists[(v, vv)]
+      new_mask = mask | (1 << vv)
+      new_rem_time = rem_time - dists[v][vv]
       best = max(best, flow + go(vv, new_mask, new_rem_time, agent_idx))
 
     return best
 
-  return go(start_valve,
+  return go(graph.start,
             mask=0,
             rem_time=available_time,
             agent_idx=num_agents - 1)
 
 
+def best_flow_per_subset(
+    graph: ValveGraph,
+    available_time: int,
+) -> np.ndarray:
+  """Returns the best flow a single agent gets for every subset of valves.
+
+  The result is indexed by a bitmask over the nonzero rate valves. Entry `mask`
+  holds the best flow obtained by opening valves from `mask` only; subsets that
+  can't be opened in time keep the best flow of their reachable subsets.
+  """
+  k = graph.num_nonzero_rate_valves
+  rates = graph.rates
+  # Plain lists, indexing numpy arrays element by element is slow.
+  dists = graph.dists.tolist()
+
+  best = [0] * (1 << k)
+
+  def go(u: int, mask: int, rem_time: int, flow: int):
+    nonlocal best
+    best[mask] = max(best[mask], flow)
+    for v in range(k):
+      if mask & (1 << v):
+        continue
+      # 1 unit of time to open the valve.
+      new_rem_time = rem_time - dists[u][v] - 1
+      if new_rem_time <= 0:
+        continue
+      go(v, mask | (1 << v), new_rem_time, flow + rates[v] * new_rem_time)
+
+  for v in range(k):
+    rem_time = available_time - dists[graph.start][v] - 1
+    if rem_time > 0:
+      go(v, 1 << v, rem_time, rates[v] * rem_time)
+
+  # Subset-max (SOS) pass: afterwards `flows[mask]` is the best flow over all
+  # the subsets of `mask`. Viewing the array as a `2 x 2 x ... x 2` tensor, each
+  # axis corresponds to one valve, so a running max along that axis propagates
+  # the best flow from masks without the valve to masks with it.
+  flows = np.array(best, dtype=np.int64).reshape((2,) * k)
+  for axis in range(k):
+    flows = np.maximum.accumulate(flows, axis=axis)
+  return flows.reshape(-1)
+
+
+def max_flow_by_subsets(
+    graph: ValveGraph,
+    available_time: int,
+    num_agents: int,
+) -> int:
+  """Same as `max_flow` but splits the valves into disjoint agent subsets.
+
+  Agents don't interact except that they can't open the same valve twice, so
+  the best total flow is the best way to partition the valves between agents.
+  """
+  flows = best_flow_per_subset(graph, available_time)
+  full = len(flows) - 1
+
+  # `combined[mask]` is the best flow of the agents so far using only valves
+  # from `mask`. Merging another agent enumerates all submasks of each mask.
+  combined = flows
+  for _ in range(num_agents - 2):
+    merged = np.zeros_like(flows)
+    for mask in range(full + 1):
+      sub, best = mask, 0
+      while True:
+        best = max(best, flows[sub] + combined[mask ^ sub])
+        if sub == 0:
+          break
+        sub = (sub - 1) & mask
+      merged[mask] = best
+    combined = merged
+
+  if num_agents == 1:
+    return int(flows[full])
+
+  # Both arrays are subset-maxed, so the last agent takes the complement of the
+  # others' valves. Note that `full ^ mask == full - mask`, so the complement of
+  # each mask is found by reversing the array.
+  return int(np.max(combined + flows[::-1]))
+
+
 def main(argv):
-  valves = parse(_INPUT_FILE.value)
+  valves, adjacency = parse(_INPUT_FILE.value)
 
   aa_idx = [i for (i, v) in enumerate(valves) if v.name == 'AA'][0]
+  graph = compress(valves, all_pairs_shortest_path(adjacency), aa_idx)
+
+  solve = max_flow_by_subsets
+  if _SOLVER.value == 'recursive':
+    solve = max_flow
 
-  print(
-      max_flow(valves, start_valve_idx=aa_idx, available_time=30, num_agents=1))
+  print(solve(graph, available_time=30, num_agents=1))
 
-  # Part 2 takes around ~80 seconds.
-  print(
-      max_flow(valves, start_valve_idx=aa_idx, available_time=26, num_agents=2))
+  # Part 2 takes around ~80 seconds with the `recursive` solver.
+  print(solve(graph, available_time=26, num_agents=2))
 
 
 if __name__ == '__main__':
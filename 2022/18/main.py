@@ -3,9 +3,15 @@ from absl import flags
 from typing import Sequence
 
 import collections
+import dataclasses
+import numpy as np
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_MODE = flags.DEFINE_enum(
+    'mode', 'voxels', ['voxels', 'points'],
+    'How to represent the droplet. `points` is a set of int encoded cubes, '
+    '`voxels` a dense boolean 3D array.')
 
 
 class Point(collections.namedtuple('Point', 'x y z')):
@@ -16,16 +22,28 @@ class Point(collections.namedtuple('Point', 'x y z')):
     return Point(x + a, y + b, z + c)
 
 
-Grid = set[Point]
+def encode(p: Point, size: int) -> int:
+  x, y, z = p
+  return (x * size + y) * size + z
 
 
-def parse(path: str) -> Grid:
+@dataclasses.dataclass(frozen=True)
+class Grid():
+  """The cubes of a droplet, each encoded as a single int.
 
-  def parse_point(s: str) -> Point:
-    return Point(*map(int, s.split(',')))
+  Coordinates are shifted to be within `[2, size - 3]`, and a cube `(x, y, z)`
+  is encoded as `x * size**2 + y * size + z`. So neighbors are found by adding
+  constant offsets, and a cube and its neighbors never wrap around an axis.
+  """
+  cubes: frozenset[int]
+  size: int
 
-  with open(path) as f:
-    return set([parse_point(l) for l in f.read().splitlines()])
+  def encode(self, p: Point) -> int:
+    return encode(p, self.size)
+
+  def offsets(self) -> tuple[int, ...]:
+    """Returns what to add to a cube to get each of its neighbors."""
+    return tuple(self.encode(e) for e in EDGES)
 
 
 EDGES = (
@@ -38,45 +56,124 @@ EDGES = (
 )
 
 
+def parse(path: str) -> Grid:
+
+  def parse_point(s: str) -> Point:
+    return Point(*map(int, s.split(',')))
+
+  with open(path) as f:
+    points = [parse_point(l) for l in f.read().splitlines()]
+
+  lo = min(min(p) for p in points)
+  hi = max(max(p) for p in points)
+  size = hi - lo + 5
+  shift = Point(2 - lo, 2 - lo, 2 - lo)
+  return Grid(
+      cubes=frozenset(encode(p + shift, size) for p in points),
+      size=size,
+  )
+
+
 def surface_area(grid: Grid) -> int:
+  cubes = grid.cubes
+  offsets = grid.offsets()
   area = 0
-  for p in grid:
+  for c in cubes:
     area += 6
-    for e in EDGES:
-      if (p + e) in grid:
+    for o in offsets:
+      if (c + o) in cubes:
         area -= 1
   return area
 
 
 def external_surface_area(grid: Grid) -> int:
-  xs = [p.x for p in grid]
-  ys = [p.y for p in grid]
-  zs = [p.z for p in grid]
-
-  lower_bound = min(xs + ys + zs) - 1
-  upper_bound = max(xs + ys + zs) + 1
+  cubes = grid.cubes
+  offsets = grid.offsets()
+  n = grid.size
 
-  q = [Point(lower_bound, lower_bound, lower_bound)]
+  # The search stays within `[1, n - 2]` on all axes, which surrounds the
+  # droplet with air. Marking the faces of `[0, n - 1]` as seen fences it in.
+  ends = (0, n - 1)
   seen = set()
+  for i in range(n):
+    for j in range(n):
+      for k in ends:
+        seen |= {
+            grid.encode(Point(k, i, j)),
+            grid.encode(Point(i, k, j)),
+            grid.encode(Point(i, j, k)),
+        }
+
+  start = grid.encode(Point(1, 1, 1))
+  q = [start]
+  seen.add(start)
 
   area = 0
   while q:
     u = q.pop()
-    if u in seen:
-      continue
-
-    seen.add(u)
-    for e in EDGES:
-      v = u + e
-      if v in grid:
+    for o in offsets:
+      v = u + o
+      if v in cubes:
         area += 1
-        continue
-      if all(e >= lower_bound and e <= upper_bound for e in v):
+      elif v not in seen:
+        seen.add(v)
         q.append(v)
   return area
 
 
+def parse_voxels(path: str) -> np.ndarray:
+  """Returns the droplet as a boolean 3D array, padded with air on all sides."""
+  cubes = np.loadtxt(path, delimiter=',', dtype=np.int64, ndmin=2)
+  lo = cubes.min(axis=0)
+  hi = cubes.max(axis=0)
+
+  voxels = np.zeros(hi - lo + 3, dtype=bool)
+  cubes = cubes - lo + 1
+  voxels[cubes[:, 0], cubes[:, 1], cubes[:, 2]] = True
+  return voxels
+
+
+def voxels_surface_area(voxels: np.ndarray) -> int:
+  """Same as `surface_area`, counting cube/air transitions along each axis."""
+  area = 0
+  for axis in range(3):
+    area += np.count_nonzero(np.diff(voxels, axis=axis))
+  return area
+
+
+def voxels_external_surface_area(voxels: np.ndarray) -> int:
+  """Same as `external_surface_area`, flooding the air from the border."""
+  air = ~voxels
+  outside = np.zeros_like(voxels)
+  # The padding is outside the droplet.
+  outside[[0, -1], :, :] = True
+  outside[:, [0, -1], :] = True
+  outside[:, :, [0, -1]] = True
+
+  while True:
+    grown = outside.copy()
+    grown[1:, :, :] |= outside[:-1, :, :]
+    grown[:-1, :, :] |= outside[1:, :, :]
+    grown[:, 1:, :] |= outside[:, :-1, :]
+    grown[:, :-1, :] |= outside[:, 1:, :]
+    grown[:, :, 1:] |= outside[:, :, :-1]
+    grown[:, :, :-1] |= outside[:, :, 1:]
+    grown &= air
+    if np.array_equal(grown, outside):
+      break
+    outside = grown
+
+  # Air pockets inside the droplet count as part of it.
+  return voxels_surface_area(~outside)
+
+
 def main(argv):
+  if _MODE.value == 'voxels':
+    voxels = parse_voxels(_INPUT_FILE.value)
+    print(voxels_surface_area(voxels))
+    print(voxels_external_surface_area(voxels))
+    return
+
   grid = parse(_INPUT_FILE.value)
   print(surface_area(grid))
   print(external_surface_area(grid))
@@ -2,10 +2,18 @@ from absl import app
 from absl import flags
 from typing import Any
 
+import bisect
 import copy
+import itertools
+import math
 
 FLAGS = flags.FLAGS
 _INPUT_FILE = flags.DEFINE_string('input', None, 'Path to the input file.')
+_ENGINE = flags.DEFINE_enum(
+    'engine', 'blocks', ['blocks', 'linked', 'swaps'],
+    'How to mix the numbers. `swaps` moves each number by swapping it with its '
+    'neighbors, `blocks` keeps the numbers in a list of ~sqrt(n) blocks and '
+    '`linked` in a linked list with skip pointers.')
 
 
 def parse(path: str) -> list[int]:
@@ -31,21 +39,183 @@ def mixin(xs: list[int], repeat=1) -> list[int]:
   return xs
 
 
+def mixin_blocks(xs: list[int], repeat=1) -> list[int]:
+  """Same as `mixin`, in O(sqrt(n)) per moved number.
+
+  The (original indices of the) numbers are kept in order in a list of blocks.
+  Finding, removing or inserting a number only walks the block sizes and then
+  works within a single block of ~sqrt(n) numbers.
+  """
+  n = len(xs)
+  if n <= 1:
+    return copy.copy(xs)
+
+  # Block operations are mostly memmoves, so a few times sqrt(n) is faster.
+  block_size = 4 * math.isqrt(n)
+  # `blocks`, `sizes` and `ids` are in order. Each number knows the id of its
+  # block, which unlike the index of the block doesn't change when a block is
+  # split or removed.
+  blocks, sizes, ids = [], [], []
+  where = [0] * n
+  next_id = 0
+
+  def rebuild(order: list[int]):
+    nonlocal blocks, sizes, ids, next_id
+    blocks = [order[k:k + block_size] for k in range(0, n, block_size)]
+    sizes = [len(b) for b in blocks]
+    ids = list(range(next_id, next_id + len(blocks)))
+    next_id += len(blocks)
+    for (block_id, block) in zip(ids, blocks):
+      for i in block:
+        where[i] = block_id
+
+  rebuild(list(range(n)))
+  for _ in range(repeat):
+    # Rebalance the blocks once per round.
+    rebuild([j for block in blocks for j in block])
+
+    for i in range(n):
+      b = ids.index(where[i])
+      k = blocks[b].index(i)
+      del blocks[b][k]
+      sizes[b] -= 1
+
+      pos = (sum(sizes[:b]) + k + xs[i]) % (n - 1)
+      if sizes[b] == 0:
+        del blocks[b], sizes[b], ids[b]
+
+      # First block whose end is at or past `pos`.
+      ends = list(itertools.accumulate(sizes))
+      b = bisect.bisect_left(ends, pos)
+      blocks[b].insert(pos - (ends[b] - sizes[b]), i)
+      sizes[b] += 1
+      where[i] = ids[b]
+
+      if sizes[b] > 2 * block_size:
+        # Split the block in two halves.
+        half = blocks[b][block_size:]
+        del blocks[b][block_size:]
+        sizes[b] = block_size
+        blocks.insert(b + 1, half)
+        sizes.insert(b + 1, len(half))
+        ids.insert(b + 1, next_id)
+        for j in half:
+          where[j] = next_id
+        next_id += 1
+
+  return [xs[i] for block in blocks for i in block]
+
+
+class LinkedRing():
+  """Circular doubly linked list of numbers, with skip pointers.
+
+  Nodes are the original indices of the numbers. Besides `nxt` and `prv`, each
+  node has a `jump` to the node `step ~ sqrt(n)` positions after it, so walking
+  `m` positions takes O(m / step + step) hops.
+  """
+
+  def __init__(self, xs: list[int]):
+    n = len(xs)
+    self.values = xs
+    # Moving a node shifts the jumps of 2 * `step` nodes, while walking takes
+    # ~n / (2 * step) jumps and ~step / 2 single hops, so the total is
+    # smallest around step = sqrt(n / 5).
+    self.step = max(1, math.isqrt(n // 5))
+    self.nxt = [(i + 1) % n for i in range(n)]
+    self.prv = [(i - 1) % n for i in range(n)]
+    self.jump = [(i + self.step) % n for i in range(n)]
+
+  def walk(self, node: int, steps: int) -> int:
+    """Returns the node `steps` positions after `node`."""
+    jump, nxt = self.jump, self.nxt
+    for _ in range(steps // self.step):
+      node = jump[node]
+    for _ in range(steps % self.step):
+      node = nxt[node]
+    return node
+
+  def _shift_jumps(self, node: int, ahead: list[int]):
+    """Moves the jumps of `node` and of the `step - 1` nodes before it by one.
+
+    `ahead` is `nxt` or `prv`, depending on the direction of the shift.
+    """
+    prv, jump = self.prv, self.jump
+    for _ in range(self.step):
+      jump[node] = ahead[jump[node]]
+      node = prv[node]
+
+  def move(self, node: int, steps: int):
+    """Moves `node` forward by `steps` positions, with 0 < `steps` < n - 1."""
+    nxt, prv, jump = self.nxt, self.prv, self.jump
+
+    # Unlink the node. The jumps of the `step` nodes before it now land one
+    # node too early. Since `nxt[node]` is kept, those landing on the node
+    # itself move on to the node after it.
+    before, after = prv[node], nxt[node]
+    nxt[before], prv[after] = after, before
+    self._shift_jumps(before, nxt)
+
+    before = self.walk(before, steps)
+    after = nxt[before]
+    nxt[before], prv[node] = node, before
+    nxt[node], prv[after] = after, node
+    # The jumps of the `step` nodes before the node now land one node too far.
+    self._shift_jumps(before, prv)
+    jump[node] = nxt[jump[before]]
+
+
+def mixin_linked(xs: list[int], repeat=1) -> LinkedRing:
+  """Same as `mixin`, in O(sqrt(n)) per moved number."""
+  n = len(xs)
+  ring = LinkedRing(xs)
+  if n <= 1:
+    return ring
+
+  for _ in range(repeat):
+    for i in range(n):
+      # Moving by `n - 1` puts the number back at the same place.
+      steps = xs[i] % (n - 1)
+      if steps:
+        ring.move(i, steps)
+
+  return ring
+
+
 def grove_coordinates(xs: list[int]) -> tuple[int, ...]:
   n = len(xs)
   i = xs.index(0)
   return tuple(xs[(i + 1000 * offset) % n] for offset in [1, 2, 3])
 
 
+def grove_coordinates_linked(ring: LinkedRing) -> tuple[int, ...]:
+  """Same as `grove_coordinates`, without materializing the ring."""
+  n = len(ring.values)
+  node = ring.values.index(0)
+  coordinates = []
+  for _ in range(3):
+    node = ring.walk(node, 1000 % n)
+    coordinates.append(ring.values[node])
+  return tuple(coordinates)
+
+
 def main(argv):
   xs = parse(_INPUT_FILE.value)
 
+  def solve(xs: list[int], repeat=1) -> int:
+    if _ENGINE.value == 'linked':
+      return sum(grove_coordinates_linked(mixin_linked(xs, repeat)))
+
+    mix = mixin_blocks
+    if _ENGINE.value == 'swaps':
+      mix = mixin
+    return sum(grove_coordinates(mix(xs, repeat)))
+
   # Part 1.
-  print(sum(grove_coordinates(mixin(xs))))
+  print(solve(xs))
 
   # Part 2.
   xs = [811589153 * x for x in xs]
-  print(sum(grove_coordinates(mixin(xs, repeat=10))))
+  print(solve(xs, repeat=10))
 
 
 if __name__ == '__main__':
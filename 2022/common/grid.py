@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def read_grid(path: str) -> np.ndarray:
+  """Returns the characters of a rectangular text file as a uint8 grid.
+
+  The grid is a read-only view over the file bytes that skips the line endings,
+  so there is no per-cell work. Lines may end with `\n` or `\r\n`, and trailing
+  blank lines are ignored.
+  """
+  with open(path, 'rb') as f:
+    data = f.read()
+
+  end = len(data)
+  while end > 0 and data[end - 1] in b'\r\n':
+    end -= 1
+
+  width = data.find(b'\n', 0, end)
+  if width < 0:
+    width = end  # A single line.
+  eol = 1
+  if width > 0 and data[width - 1] == ord('\r'):
+    width, eol = width - 1, 2
+
+  # Each row is followed by its line ending, except for the last one.
+  stride = width + eol
+  rows, rem = divmod(end + eol, stride)
+  assert rem == 0, 'Lines must all have the same length.'
+
+  cells = np.frombuffer(data, dtype=np.uint8, count=end)
+  return np.lib.stride_tricks.as_strided(cells,
+                                         shape=(rows, width),
+                                         strides=(stride, 1),
+                                         writeable=False)